@@ -0,0 +1,26 @@
+class Error(Exception):
+    pass
+
+
+class DocumentTypeError(Error):
+    def __init__(self, type_name: str) -> None:
+        message = f"Object type is '{type_name}', expected 'Dict'"
+        super().__init__(message)
+
+
+class BinaryNotFoundError(Error):
+    def __init__(self, name: str) -> None:
+        message = f"'{name}' not found in PATH"
+        super().__init__(message)
+
+
+class ExecutorCancelledError(Error):
+    def __init__(self) -> None:
+        message = "Executor was cancelled"
+        super().__init__(message)
+
+
+class DeadlineExceededError(Error):
+    def __init__(self) -> None:
+        message = "Time budget exceeded"
+        super().__init__(message)
@@ -0,0 +1,336 @@
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, TextIO
+
+from gitlab_ci_common.exceptions import DeadlineExceededError
+from gitlab_ci_common.stream import iter_entries
+
+logger = logging.getLogger(__name__)
+
+REMOTE_PREFIXES = ("http://", "https://")
+
+# Changes whenever the file changes, None if missing
+Signature = Optional[List[Any]]
+
+
+def file_signature(path: Path) -> Signature:
+    """Get signature identifying the state of a file.
+
+    Args:
+        path (Path): File path.
+
+    Returns:
+        Signature: Modification time, size and inode, None if missing.
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def find_repo_root(path: Path) -> Path:
+    """Find the root of the git repository containing path.
+
+    Submodules and worktrees are recognized by their '.git' file.
+
+    Args:
+        path (Path): File or directory path.
+
+    Returns:
+        Path: Repository root, current directory when not in a repository.
+    """
+    path = path.absolute()
+    for parent in [path, *path.parents]:
+        if (parent / ".git").exists():
+            return parent
+    return Path.cwd()
+
+
+def parse_local_includes(stream: TextIO) -> List[str]:
+    """Get local include patterns of a gitlab-ci yaml stream.
+
+    Args:
+        stream (TextIO): Yaml stream.
+
+    Raises:
+        DocumentTypeError: Document root is not a mapping.
+        YAMLError: Yaml stream is malformed.
+
+    Returns:
+        List[str]: Local include patterns relative to the project root.
+    """
+    for loader, key_node, value_node in iter_entries(stream):
+        if key_node.value != "include":
+            continue
+
+        data: Any = loader.construct_object(value_node, deep=True)
+        entries = data if isinstance(data, list) else [data]
+        patterns = []
+        for entry in entries:
+            if isinstance(entry, str) and not entry.startswith(REMOTE_PREFIXES):
+                patterns.append(entry)
+            elif isinstance(entry, dict) and isinstance(entry.get("local"), str):
+                patterns.append(entry["local"])
+        return patterns
+
+    return []
+
+
+def resolve_local_includes(patterns: List[str], root: Path) -> List[Path]:
+    """Resolve local include patterns to files.
+
+    Plain paths are kept even when the file does not exist, so that deleted
+    or not yet created targets still belong to the includes of a file. Glob
+    patterns only match existing files. Patterns using CI/CD variables can
+    not be resolved and are skipped.
+
+    Args:
+        patterns (List[str]): Local include patterns.
+        root (Path): Project root.
+
+    Returns:
+        List[Path]: Included files.
+    """
+    paths: List[Path] = []
+    for pattern in patterns:
+        if "$" in pattern:
+            logger.debug(f"Skipping include with variables: {pattern}")
+            continue
+
+        path = pattern.lstrip("/")
+        if "*" in path:
+            paths.extend(sorted(p for p in root.glob(path) if p.is_file()))
+        else:
+            paths.append(root / path)
+    return paths
+
+
+def display_path(path: Path) -> Path:
+    """Shorten path to be relative to current directory when possible.
+
+    Args:
+        path (Path): File path.
+
+    Returns:
+        Path: Display path.
+    """
+    if not path.is_absolute():
+        return path
+    relative = Path(os.path.relpath(path))
+    return path if relative.parts[:1] == ("..",) else relative
+
+
+class WorktreeSource:
+    """Read files from the working tree."""
+
+    def signature(self, file: Path) -> Signature:
+        """Get signature identifying the state of a file.
+
+        Args:
+            file (Path): File path.
+
+        Returns:
+            Signature: Modification time, size and inode, None if missing.
+        """
+        return file_signature(file)
+
+    def open(self, file: Path) -> TextIO:
+        """Open file for reading.
+
+        Args:
+            file (Path): File path.
+
+        Raises:
+            OSError: File can not be read.
+
+        Returns:
+            TextIO: File stream.
+        """
+        return file.open("r")
+
+
+class IncludeIndex:
+    """Index of local include relationships between files.
+
+    Include patterns are stored per file together with the file signature,
+    so only files changed since the index was built are parsed again. The
+    index can be persisted as json between runs. Files are read from the
+    working tree unless another source, such as the git index, is given.
+    Patterns are resolved against the repository root of the including
+    file, so that pipelines of submodules include from their own tree.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        root: Optional[Path] = None,
+        path: Optional[Path] = None,
+        source: Optional[WorktreeSource] = None,
+    ) -> None:
+        self.root = Path.cwd().resolve() if root is None else root.resolve()
+        self.path = path
+        self.source = WorktreeSource() if source is None else source
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.deleted: Dict[str, Dict[str, Any]] = {}
+        self.dirty = False
+
+    def load(self) -> None:
+        """Load persisted index, starting empty when missing or outdated."""
+        if self.path is None:
+            return
+        try:
+            with self.path.open("r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug(f"Failed to load include index '{self.path!s}': {e!s}")
+            return
+        if isinstance(data, dict) and data.get("version") == self.VERSION:
+            self.entries = data.get("files", {})
+
+    def save(self) -> None:
+        """Persist index when it changed."""
+        if self.path is None or not self.dirty:
+            return
+        data = {"version": self.VERSION, "files": self.entries}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.path.parent, prefix=f".{self.path.name}.", delete=False
+            ) as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            Path(f.name).replace(self.path)
+        except OSError as e:
+            logger.debug(f"Failed to save include index '{self.path!s}': {e!s}")
+            return
+        self.dirty = False
+
+    def key(self, file: Path) -> str:
+        """Get index key of a file.
+
+        Args:
+            file (Path): File path.
+
+        Returns:
+            str: Path relative to index root, absolute path outside of it.
+        """
+        path = file.resolve()
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def includes(self, file: Path) -> List[Path]:
+        """Get files directly included by a file, parsing it only if changed.
+
+        Deleted files keep the includes they had when last indexed, so their
+        targets stay in the closure of the files including them.
+
+        Args:
+            file (Path): Gitlab-ci file.
+
+        Raises:
+            DeadlineExceededError: When global deadline expires while reading.
+
+        Returns:
+            List[Path]: Resolved included files.
+        """
+        key = self.key(file)
+        signature = self.source.signature(file)
+        if signature is None:
+            if key in self.entries:
+                self.deleted[key] = self.entries.pop(key)
+                self.dirty = True
+            entry = self.deleted.get(key, {"patterns": []})
+        else:
+            entry = self.entries.get(key, {})
+            if entry.get("signature") != signature:
+                try:
+                    with self.source.open(file) as stream:
+                        patterns = parse_local_includes(stream)
+                except DeadlineExceededError:
+                    raise
+                except Exception as e:
+                    logger.debug(f"Failed to read includes of '{file!s}': {e!s}")
+                    patterns = []
+                entry = {"signature": signature, "patterns": patterns}
+                self.entries[key] = entry
+                self.dirty = True
+
+        root = find_repo_root(file.resolve().parent)
+        return [p.resolve() for p in resolve_local_includes(entry["patterns"], root)]
+
+    def closure(self, file: Path) -> Set[Path]:
+        """Get file and its transitively included files.
+
+        Args:
+            file (Path): Gitlab-ci file.
+
+        Returns:
+            Set[Path]: Resolved file paths.
+        """
+        return {p.resolve() for p in include_closure([file], self)}
+
+    def roots(self, candidates: List[Path]) -> List[Path]:
+        """Get candidates that are not included by another candidate.
+
+        Args:
+            candidates (List[Path]): Gitlab-ci files.
+
+        Returns:
+            List[Path]: Root pipeline files.
+        """
+        included: Set[Path] = set()
+        for candidate in candidates:
+            included.update(self.closure(candidate) - {candidate.resolve()})
+        return [c for c in candidates if c.resolve() not in included]
+
+    def affected(self, candidates: List[Path], changed: Set[Path]) -> List[Path]:
+        """Get root pipelines whose include closure contains a changed file.
+
+        Args:
+            candidates (List[Path]): Gitlab-ci files.
+            changed (Set[Path]): Resolved paths of changed files.
+
+        Returns:
+            List[Path]: Affected root pipeline files.
+        """
+        return [r for r in self.roots(candidates) if self.closure(r) & changed]
+
+
+def include_closure(
+    files: List[Path], index: Optional[IncludeIndex] = None
+) -> List[Path]:
+    """Get files and their transitive local includes.
+
+    Files that fail to parse are kept, but contribute no includes.
+
+    Args:
+        files (List[Path]): Gitlab-ci files.
+        index (Optional[IncludeIndex], optional): Index includes are read from,
+            reused and filled in. Defaults to a new working tree index.
+
+    Returns:
+        List[Path]: Files followed by included files, without duplicates. Included
+            files may not exist.
+    """
+    if index is None:
+        index = IncludeIndex()
+
+    result: List[Path] = []
+    seen = set()
+    queue = list(files)
+    while queue:
+        file = queue.pop(0)
+        key = file.resolve()
+        if key in seen:
+            continue
+        seen.add(key)
+        result.append(file)
+        queue.extend(display_path(p) for p in index.includes(key))
+
+    return result
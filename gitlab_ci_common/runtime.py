@@ -0,0 +1,482 @@
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from subprocess import CalledProcessError, CompletedProcess, Popen, TimeoutExpired
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TypeVar
+
+from gitlab_ci_common.exceptions import (
+    BinaryNotFoundError,
+    DeadlineExceededError,
+    ExecutorCancelledError,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_WorkItem = Tuple["Future[Any]", Callable[..., Any], Tuple[Any, ...], Dict[str, Any]]
+
+COMMAND_TIMEOUT = 120.0
+PROBE_CACHE_NAME = "probes.json"
+TIMEOUT_POLICIES = ["fail", "warn"]
+
+_probes: Dict[str, str] = {}
+_probes_lock = threading.Lock()
+_executor: Optional["Executor"] = None
+_executor_lock = threading.Lock()
+
+
+class Deadline:
+    """Point in time after which no more work should be done."""
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        self.expires = None if timeout is None else time.monotonic() + timeout
+
+    def remaining(self) -> Optional[float]:
+        """Get remaining time.
+
+        Returns:
+            Optional[float]: Seconds left, None when unlimited.
+        """
+        if self.expires is None:
+            return None
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        """Check if deadline has passed.
+
+        Returns:
+            bool: True if no time is left.
+        """
+        return self.expires is not None and time.monotonic() >= self.expires
+
+    def check(self) -> None:
+        """Check that deadline has not passed.
+
+        Raises:
+            DeadlineExceededError: Deadline has passed.
+        """
+        if self.expired():
+            raise DeadlineExceededError()
+
+    def clamp(self, timeout: Optional[float]) -> Optional[float]:
+        """Limit timeout to the remaining time.
+
+        Args:
+            timeout (Optional[float]): Timeout in seconds, None for unlimited.
+
+        Returns:
+            Optional[float]: Smaller of timeout and remaining time.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+
+_deadline = Deadline()
+
+
+def set_deadline(timeout: Optional[float]) -> Deadline:
+    """Start global time budget of the current process.
+
+    Args:
+        timeout (Optional[float]): Budget in seconds, None for unlimited.
+
+    Returns:
+        Deadline: New global deadline.
+    """
+    global _deadline  # noqa: PLW0603
+    _deadline = Deadline(timeout)
+    return _deadline
+
+
+def get_deadline() -> Deadline:
+    """Get global deadline of the current process.
+
+    Returns:
+        Deadline: Global deadline.
+    """
+    return _deadline
+
+
+def report_unfinished(names: List[str], policy: str) -> int:
+    """Report work left unfinished when the deadline passed.
+
+    Args:
+        names (List[str]): Names of unfinished files or scripts.
+        policy (str): 'warn' to pass with a warning, 'fail' to fail.
+
+    Returns:
+        int: Return code.
+    """
+    for name in names:
+        if policy == "warn":
+            logger.warning(f"Time budget exceeded before '{name}' was finished")
+        else:
+            logger.error(f"Time budget exceeded before '{name}' was finished")
+    return 0 if policy == "warn" or not names else 1
+
+
+def positive_float(value: str) -> float:
+    """Parse positive number of seconds for argparse.
+
+    Args:
+        value (str): Argument value.
+
+    Raises:
+        ArgumentTypeError: Value is not a positive number.
+
+    Returns:
+        float: Parsed value.
+    """
+    try:
+        number = float(value)
+    except ValueError:
+        number = float("nan")
+    if not number > 0 or number == float("inf"):
+        msg = f"must be a positive number: '{value}'"
+        raise argparse.ArgumentTypeError(msg)
+    return number
+
+
+def cache_dir() -> Path:
+    """Get cache directory of gitlab-ci tools.
+
+    Returns:
+        Path: Cache directory path.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "gitlab-ci-pre-commit"
+
+
+def find_binary(name: str) -> Path:
+    """Find binary in PATH.
+
+    Args:
+        name (str): Binary name.
+
+    Raises:
+        BinaryNotFoundError: Binary not in PATH.
+
+    Returns:
+        Path: Resolved binary path.
+    """
+    path = shutil.which(name)
+    if path is None:
+        raise BinaryNotFoundError(name)
+    return Path(path).resolve()
+
+
+def _load_probes(path: Path) -> Dict[str, str]:
+    try:
+        with path.open("r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Failed to load probe cache '{path!s}': {e!s}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_probes(path: Path, probes: Dict[str, str]) -> None:
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, prefix=f".{path.name}.", delete=False
+        ) as f:
+            json.dump(probes, f, indent=2, sort_keys=True)
+        Path(f.name).replace(path)
+    except OSError as e:
+        logger.debug(f"Failed to save probe cache '{path!s}': {e!s}")
+
+
+def probe_version(name: str, args: Optional[List[str]] = None) -> str:
+    """Get version output of a binary.
+
+    Results are cached on disk, keyed by resolved binary path, modification
+    time and inode, so a binary is only probed again after it changes.
+
+    Args:
+        name (str): Binary name.
+        args (Optional[List[str]], optional): Version arguments. Defaults to
+            ["--version"].
+
+    Raises:
+        BinaryNotFoundError: Binary not in PATH.
+        CalledProcessError: Version command failed.
+        TimeoutExpired: Version command timed out.
+
+    Returns:
+        str: Stripped version output.
+    """
+    if args is None:
+        args = ["--version"]
+
+    binary = find_binary(name)
+    stat = binary.stat()
+    key = f"{binary!s}:{stat.st_mtime_ns}:{stat.st_ino}:{' '.join(args)}"
+
+    with _probes_lock:
+        if key in _probes:
+            return _probes[key]
+
+        path = cache_dir() / PROBE_CACHE_NAME
+        probes = _load_probes(path)
+        if key in probes:
+            logger.debug(f"Probe cache hit: {key}")
+            _probes[key] = probes[key]
+            return probes[key]
+
+        logger.debug(f"Probe cache miss: {key}")
+        version = run_command([str(binary), *args]).stdout.strip()
+
+        probes = {k: v for k, v in probes.items() if not k.startswith(f"{binary!s}:")}
+        probes[key] = version
+        _save_probes(path, probes)
+        _probes[key] = version
+        return version
+
+
+def kill_process(process: "Popen[str]") -> None:
+    """Kill process together with its children.
+
+    Commands are started in their own session, so wrapper scripts can not
+    leave children behind that keep the output pipes open.
+
+    Args:
+        process (Popen[str]): Process to kill.
+    """
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def run_command(
+    cmd: List[str],
+    input: Optional[str] = None,
+    timeout: Optional[float] = COMMAND_TIMEOUT,
+    check: bool = True,
+    processes: Optional[Set["Popen[str]"]] = None,
+) -> "CompletedProcess[str]":
+    """Run command, killing it when the timeout or the global deadline expires.
+
+    Args:
+        cmd (List[str]): Command and arguments.
+        input (Optional[str], optional): Standard input. Defaults to None.
+        timeout (Optional[float], optional): Timeout in seconds. Defaults to
+            COMMAND_TIMEOUT.
+        check (bool, optional): Raise on non-zero return code. Defaults to True.
+        processes (Optional[Set[Popen[str]]], optional): Set the running process is
+            registered in, so that it can be killed. Defaults to None.
+
+    Raises:
+        CalledProcessError: Command returned non-zero return code.
+        TimeoutExpired: Command timed out.
+        DeadlineExceededError: Global deadline expired.
+
+    Returns:
+        CompletedProcess[str]: Completed process with captured output.
+    """
+    deadline = get_deadline()
+    deadline.check()
+    timeout = deadline.clamp(timeout)
+
+    logger.debug(f"Running command: {cmd}")
+
+    with Popen(
+        cmd,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        shell=False,
+        universal_newlines=True,
+        text=True,
+        start_new_session=True,
+    ) as process:
+        if processes is not None:
+            processes.add(process)
+        try:
+            stdout, stderr = process.communicate(input, timeout=timeout)
+        except TimeoutExpired as e:
+            kill_process(process)
+            process.communicate()
+            if deadline.expired():
+                raise DeadlineExceededError() from e
+            raise
+        finally:
+            if processes is not None:
+                processes.discard(process)
+
+    if check and process.returncode != 0:
+        raise CalledProcessError(process.returncode, cmd, stdout, stderr)
+
+    return CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+class Executor:
+    """Bounded concurrent executor for functions and commands.
+
+    Cancelling the executor cancels pending work and kills running commands.
+    Workers are daemon threads, so work abandoned after the deadline does not
+    keep the process from exiting.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None) -> None:
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self.max_workers = max_workers
+        self._queue: "queue.SimpleQueue[Optional[_WorkItem]]" = queue.SimpleQueue()
+        self._idle = threading.Semaphore(0)
+        self._threads: List[threading.Thread] = []
+        self._futures: Set["Future[Any]"] = set()
+        self._processes: Set["Popen[str]"] = set()
+        self._lock = threading.Lock()
+        self.cancelled = False
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            (future, fn, args, kwargs) = item
+            del item
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            del future
+            self._idle.release()
+
+    def submit(
+        self, fn: Callable[..., T], *args: object, **kwargs: object
+    ) -> "Future[T]":
+        """Schedule function call.
+
+        Args:
+            fn (Callable[..., T]): Function.
+            *args (object): Positional arguments.
+            **kwargs (object): Keyword arguments.
+
+        Raises:
+            ExecutorCancelledError: Executor was cancelled.
+
+        Returns:
+            Future[T]: Function result.
+        """
+        future: "Future[T]" = Future()
+        with self._lock:
+            if self.cancelled:
+                raise ExecutorCancelledError()
+            self._futures.add(future)
+            self._queue.put((future, fn, args, kwargs))
+            if not self._idle.acquire(blocking=False) and (
+                len(self._threads) < self.max_workers
+            ):
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"gitlab-ci_{len(self._threads)}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def run(
+        self,
+        cmd: List[str],
+        input: Optional[str] = None,
+        timeout: Optional[float] = COMMAND_TIMEOUT,
+        check: bool = True,
+    ) -> "Future[CompletedProcess[str]]":
+        """Schedule command, see run_command.
+
+        Args:
+            cmd (List[str]): Command and arguments.
+            input (Optional[str], optional): Standard input. Defaults to None.
+            timeout (Optional[float], optional): Timeout in seconds. Defaults to
+                COMMAND_TIMEOUT.
+            check (bool, optional): Raise on non-zero return code. Defaults to True.
+
+        Returns:
+            Future[CompletedProcess[str]]: Completed process.
+        """
+        return self.submit(
+            run_command,
+            cmd,
+            input=input,
+            timeout=timeout,
+            check=check,
+            processes=self._processes,
+        )
+
+    def cancel(self) -> None:
+        """Cancel pending work and kill running commands."""
+        with self._lock:
+            self.cancelled = True
+            for future in list(self._futures):
+                future.cancel()
+            for process in list(self._processes):
+                kill_process(process)
+
+    def shutdown(self, cancel: bool = False) -> None:
+        """Release executor threads once scheduled work finished.
+
+        Args:
+            cancel (bool, optional): Cancel work first. Defaults to False.
+        """
+        if cancel:
+            self.cancel()
+        with self._lock:
+            self.cancelled = True
+            threads = list(self._threads)
+            for _ in threads:
+                self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def __enter__(self) -> "Executor":  # noqa: D105
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:  # noqa: D105
+        self.shutdown(cancel=exc_info[0] is not None)
+
+
+def get_executor() -> Executor:
+    """Get executor shared by the current process.
+
+    Returns:
+        Executor: Shared executor.
+    """
+    global _executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None or _executor.cancelled:
+            _executor = Executor()
+        return _executor
+
+
+@atexit.register
+def _cancel_executor() -> None:
+    # Abandoned commands must not outlive the process.
+    if _executor is not None:
+        _executor.cancel()
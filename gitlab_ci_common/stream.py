@@ -0,0 +1,96 @@
+from typing import Any, Hashable, Iterator, Set, TextIO, Tuple
+
+import yaml
+from yaml.composer import ComposerError
+from yaml.constructor import ConstructorError
+from yaml.events import MappingEndEvent, MappingStartEvent, StreamEndEvent
+from yaml.nodes import MappingNode, Node
+
+from gitlab_ci_common.exceptions import DocumentTypeError
+
+MAPPING_TAG = "tag:yaml.org,2002:map"
+MERGE_TAG = "tag:yaml.org,2002:merge"
+
+
+def _check_single_document(loader: Any) -> None:  # noqa: ANN401
+    loader.get_event()
+    if not loader.check_event(StreamEndEvent):
+        event = loader.get_event()
+        context = "expected a single document in the stream"
+        problem = "but found another document"
+        raise ComposerError(context, None, problem, event.start_mark)
+
+
+def iter_entries(stream: TextIO) -> Iterator[Tuple[yaml.SafeLoader, Node, Node]]:
+    """Iterate over top level entries of a yaml mapping stream.
+
+    The document is walked as an event stream and composed one top level
+    entry at a time, so only a single entry is held in memory. Nodes are
+    left unconstructed, use the yielded loader to construct the parts that
+    are needed.
+
+    Entries of merge keys ('<<') are yielded in place of the merge key,
+    except keys already defined before. Consumers letting later entries
+    replace earlier ones with the same key get the mapping of
+    yaml.safe_load.
+
+    Args:
+        stream (TextIO): Yaml stream.
+
+    Raises:
+        DocumentTypeError: Document root is not a mapping.
+        YAMLError: Yaml stream is malformed.
+
+    Yields:
+        Iterator[Tuple[yaml.SafeLoader, Node, Node]]: Loader, key and value nodes.
+    """
+    # The event api of the loader is untyped in the PyYAML stubs.
+    loader: Any = yaml.SafeLoader(stream)
+    try:
+        loader.get_event()
+        if loader.check_event(StreamEndEvent):
+            raise DocumentTypeError(type(None).__name__)
+
+        loader.get_event()
+        event = loader.peek_event()
+        mark = event.start_mark
+        if not isinstance(event, MappingStartEvent) or event.tag not in [
+            None,
+            "!",
+            MAPPING_TAG,
+        ]:
+            node = loader.compose_node(None, None)
+            _check_single_document(loader)
+            data = loader.construct_document(node)
+            raise DocumentTypeError(type(data).__name__)
+
+        loader.get_event()
+        defined: Set[Hashable] = set()
+        while not loader.check_event(MappingEndEvent):
+            key_node = loader.compose_node(None, None)
+            value_node = loader.compose_node(None, None)
+
+            merge = key_node.tag == MERGE_TAG
+            entry = MappingNode(MAPPING_TAG, [(key_node, value_node)], mark)
+            loader.flatten_mapping(entry)
+            for entry_key_node, entry_value_node in entry.value:
+                key = loader.construct_object(entry_key_node, deep=True)
+                if not isinstance(key, Hashable):
+                    context = "while constructing a mapping"
+                    problem = "found unhashable key"
+                    raise ConstructorError(
+                        context, mark, problem, entry_key_node.start_mark
+                    )
+                if not merge:
+                    defined.add(key)
+                elif key in defined:
+                    continue
+                yield (loader, entry_key_node, entry_value_node)
+
+            loader.constructed_objects = {}
+            loader.recursive_objects = {}
+
+        loader.get_event()
+        _check_single_document(loader)
+    finally:
+        loader.dispose()
@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from gitlab_ci_common.includes import (
+    IncludeIndex,
+    Signature,
+    file_signature,
+    include_closure,
+)
+from gitlab_ci_common.runtime import get_executor
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+
+POLL_INTERVAL = 0.05
+SETTLE_DELAY = 0.01
+
+
+class Inotify:
+    """Minimal inotify binding watching directories for any change.
+
+    Directories are watched instead of files, so that editors replacing
+    files by rename are noticed as well.
+    """
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd: int = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.directories: Set[Path] = set()
+
+    def add(self, directory: Path) -> bool:
+        """Watch directory for changes.
+
+        Args:
+            directory (Path): Directory path.
+
+        Returns:
+            bool: True if the directory is watched.
+        """
+        if directory in self.directories:
+            return True
+        if self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            logger.debug(f"Failed to watch '{directory!s}': {os.strerror(errno)}")
+            return False
+        self.directories.add(directory)
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for events and discard them.
+
+        Args:
+            timeout (Optional[float], optional): Timeout in seconds. Defaults to None.
+        """
+        if select.select([self.fd], [], [], timeout)[0]:
+            time.sleep(SETTLE_DELAY)
+            self.drain()
+
+    def drain(self) -> None:
+        """Discard pending events."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self) -> None:
+        """Close inotify instance."""
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Wait for changes of a set of files.
+
+    Uses inotify when available and falls back to polling file signatures,
+    also while the directory of a watched file does not exist yet.
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL) -> None:
+        self.interval = interval
+        self.signatures: Dict[Path, Signature] = {}
+        self.inotify: Optional[Inotify] = None
+        self.polling = False
+
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                logger.debug(f"Inotify unavailable, polling for changes: {e!s}")
+
+    def update(self, paths: Iterable[Path]) -> None:
+        """Set watched files, keeping signatures of already watched ones.
+
+        Args:
+            paths (Iterable[Path]): File paths.
+        """
+        signatures = {}
+        polling = False
+        for path in paths:
+            if path in self.signatures:
+                signatures[path] = self.signatures[path]
+            else:
+                signatures[path] = file_signature(path)
+            if self.inotify is not None and not self.inotify.add(
+                path.absolute().parent
+            ):
+                polling = True
+        self.signatures = signatures
+        self.polling = polling
+
+    def changes(self) -> Set[Path]:
+        """Get watched files changed since the last call.
+
+        Returns:
+            Set[Path]: Changed files.
+        """
+        changed = set()
+        for path, signature in self.signatures.items():
+            current = file_signature(path)
+            if current != signature:
+                self.signatures[path] = current
+                changed.add(path)
+        return changed
+
+    def wait(self) -> Set[Path]:
+        """Block until watched files change.
+
+        Returns:
+            Set[Path]: Changed files, removed files excluded.
+        """
+        while True:
+            changed = {p for p in self.changes() if self.signatures[p] is not None}
+            if changed:
+                return changed
+            if self.inotify is not None:
+                self.inotify.wait(self.interval if self.polling else None)
+            else:
+                time.sleep(self.interval)
+
+    def close(self) -> None:
+        """Release watcher resources."""
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+
+def watch(files: List[Path], run: Callable[[List[Path]], int]) -> int:
+    """Run on files and their local includes, then again on every change.
+
+    Includes are re-read only for changed files. Included files that do not
+    exist yet are watched as well and run on as soon as they appear.
+
+    Args:
+        files (List[Path]): Gitlab-ci files.
+        run (Callable[[List[Path]], int]): Callback returning a return code.
+
+    Returns:
+        int: Return code, 0 when interrupted.
+    """
+    index = IncludeIndex()
+    watcher = FileWatcher()
+    try:
+        paths = include_closure(files, index)
+        watcher.update(paths)
+        logger.info(f"Watching {len(paths)} files for changes")
+        run([p for p in paths if p.exists()])
+
+        while True:
+            changed = watcher.wait()
+            started = time.monotonic()
+
+            previous = set(paths)
+            paths = include_closure(files, index)
+            watcher.update(paths)
+
+            targets = [
+                p
+                for p in paths
+                if (p in changed or p not in previous)
+                and watcher.signatures[p] is not None
+            ]
+            logger.debug(f"Changed files: {[str(p) for p in targets]}")
+            return_code = run(targets)
+
+            elapsed = (time.monotonic() - started) * 1000
+            logger.info(f"Checked {len(targets)} files in {elapsed:.0f} ms")
+            if return_code == 0:
+                logger.info("No issues found")
+    except KeyboardInterrupt:
+        get_executor().cancel()
+        return 0
+    finally:
+        watcher.close()
@@ -1,14 +1,24 @@
-# ruff: noqa: PLR0911, PLR0912
+# ruff: noqa: C901, PLR0911, PLR0912
+# C901 `format_files` is too complex
 # PLR0911 Too many return statements
 # PLR0912 Too many branches
 
 import argparse
+import hashlib
 import logging
 import os
 import sys
 from pathlib import Path
-from typing import List
-
+from typing import Dict, List, Optional
+
+from gitlab_ci_common.exceptions import DeadlineExceededError
+from gitlab_ci_common.runtime import (
+    TIMEOUT_POLICIES,
+    positive_float,
+    report_unfinished,
+    set_deadline,
+)
+from gitlab_ci_common.watch import watch as watch_files
 from gitlab_ci_fmt.utils import check_yq, format_gitlab_ci
 
 logging.basicConfig(format="%(levelname)s: %(filename)s:%(lineno)d %(message)s")
@@ -32,24 +42,89 @@ def cli(argv: List[str] = sys.argv[1:]) -> int:
     parser.add_argument(
         "-v", "--verbose", action="store_true", default=False, help="verbose output"
     )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        default=False,
+        help="format files and their local includes again on every change",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=positive_float,
+        default=None,
+        metavar="SECONDS",
+        help="time budget shared by all files, per run in watch mode",
+    )
+    parser.add_argument(
+        "--on-timeout",
+        type=str,
+        default="fail",
+        choices=TIMEOUT_POLICIES,
+        help="whether files left unfinished by the time budget fail or warn",
+    )
 
     args = parser.parse_args(argv)
 
     files: List[Path] = args.files
     verbose: bool = args.verbose
+    watch: bool = args.watch
+    timeout: Optional[float] = args.timeout
+    policy: str = args.on_timeout
+
+    set_deadline(timeout)
+
+    if watch:
+        logging.getLogger("gitlab_ci_common").setLevel(logging.INFO)
 
     if verbose or os.environ.get("DEBUG") not in [None, "false", "no", "0"]:
         logger.setLevel(logging.DEBUG)
+        logging.getLogger("gitlab_ci_common").setLevel(logging.DEBUG)
 
     logger.debug(f"Args: {args._get_kwargs()}")
 
     try:
         check_yq()
+    except DeadlineExceededError:
+        return report_unfinished([str(f) for f in files], policy)
     except Exception as e:
         logger.error(f"yq check failed: {e!s}", exc_info=verbose)
         return 1
 
-    for file in files:
+    if watch:
+        cache: Dict[str, str] = {}
+
+        def run(changed: List[Path]) -> int:
+            set_deadline(timeout)
+            return format_files(changed, verbose, policy, cache)
+
+        return watch_files(files, run)
+
+    return format_files(files, verbose, policy)
+
+
+def format_files(
+    files: List[Path],
+    verbose: bool,
+    policy: str,
+    cache: Optional[Dict[str, str]] = None,
+) -> int:
+    """Format gitlab-ci files in place.
+
+    Files left when the global deadline expires are reported according to
+    the timeout policy.
+
+    Args:
+        files (List[Path]): Files to format.
+        verbose (bool): Log tracebacks.
+        policy (str): Timeout policy, see report_unfinished.
+        cache (Optional[Dict[str, str]], optional): Formatting results by source
+            digest, reused and filled in. Defaults to None.
+
+    Returns:
+        int: Return code.
+    """
+    for i, file in enumerate(files):
         logger.debug(f"Formatting file: {file}")
         try:
             with file.open("r") as f:
@@ -61,11 +136,23 @@ def cli(argv: List[str] = sys.argv[1:]) -> int:
             logger.error(f"Failed to access '{file!s}': {e!s}", exc_info=verbose)
             return 1
 
-        try:
-            result = format_gitlab_ci(source)
-        except Exception as e:
-            logger.error(f"Failed to format file '{file!s}': {e!s}", exc_info=verbose)
-            return 1
+        digest = hashlib.sha256(source.encode()).hexdigest()
+        if cache is not None and digest in cache:
+            result = cache[digest]
+        else:
+            try:
+                result = format_gitlab_ci(source)
+            except DeadlineExceededError:
+                return report_unfinished([str(f) for f in files[i:]], policy)
+            except Exception as e:
+                logger.error(
+                    f"Failed to format file '{file!s}': {e!s}", exc_info=verbose
+                )
+                return 1
+
+        if cache is not None:
+            cache[digest] = result
+            cache[hashlib.sha256(result.encode()).hexdigest()] = result
 
         logger.debug(f"Formatting result:\n{result}")
 
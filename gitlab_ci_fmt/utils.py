@@ -1,9 +1,10 @@
 import json
 import logging
 import re
-import subprocess
-from subprocess import CalledProcessError
+from subprocess import CalledProcessError, TimeoutExpired
 
+from gitlab_ci_common.exceptions import BinaryNotFoundError
+from gitlab_ci_common.runtime import get_executor, probe_version, run_command
 from gitlab_ci_fmt.exceptions import CommandError, MalformedError, YqVersionError
 
 logger = logging.getLogger(__name__)
@@ -18,25 +19,21 @@ def check_yq() -> None:
 
     Raises:
         YqVersionError: Incompatible yq version.
-        CommandError: Yq version command failed.
+        CommandError: Yq not found or version command failed.
     """
     try:
-        process = subprocess.run(
-            ["yq", "--version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-            universal_newlines=True,
-            text=True,
-            check=True,
-        )
-        stdout = process.stdout.strip()
-        if not YQ_RE.match(stdout):
-            raise YqVersionError()
+        stdout = probe_version("yq")
+    except BinaryNotFoundError as e:
+        raise CommandError(str(e)) from e
     except CalledProcessError as e:
         stderr: str = e.stderr
         stderr = json.dumps(stderr.strip())
         raise CommandError(stderr) from e
+    except TimeoutExpired as e:
+        raise CommandError(str(e)) from e
+
+    if not YQ_RE.match(stdout):
+        raise YqVersionError()
 
 
 def yq_sort_keys(yml: str) -> str:
@@ -48,15 +45,9 @@ def yq_sort_keys(yml: str) -> str:
     Returns:
         str: sorted yaml string.
     """
-    return subprocess.run(
+    return run_command(
         ["yq", "-P", "sort_keys(..)"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=False,
         input=yml,
-        universal_newlines=True,
-        text=True,
-        check=True,
     ).stdout
 
 
@@ -70,7 +61,10 @@ def yq_compare(src: str, dst: str) -> bool:
     Returns:
         bool: True if yaml strings are equivalent.
     """
-    return yq_sort_keys(src) == yq_sort_keys(dst)
+    executor = get_executor()
+    src_sorted = executor.submit(yq_sort_keys, src)
+    dst_sorted = executor.submit(yq_sort_keys, dst)
+    return src_sorted.result() == dst_sorted.result()
 
 
 def yq_order_top_keys(yml: str) -> str:
@@ -82,18 +76,12 @@ def yq_order_top_keys(yml: str) -> str:
     Returns:
         str: Formatted yaml string.
     """
-    return subprocess.run(
+    return run_command(
         [
             "yq",
             '. |= pick(([ "workflow", "stages", "variables", "include", "default"] + keys) | unique)',
         ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=False,
         input=yml,
-        universal_newlines=True,
-        text=True,
-        check=True,
     ).stdout
 
 
@@ -106,18 +94,12 @@ def yq_order_job_keys(yml: str) -> str:
     Returns:
         str: Formatted yaml string.
     """
-    return subprocess.run(
+    return run_command(
         [
             "yq",
             '.[] |= (select(tag == "!!map") | pick((["extends", "stage", "tags", "image", "services", "only", "except", "rules", "when", "dependencies", "secrets", "needs", "artifacts", "coverage", "dast_configuration", "pages", "environment", "release", "trigger", "retry", "timeout", "parallel", "allow_failure", "interruptible", "resource_group", "variables", "inherit", "cache", "before_script", "script", "after_script"] + keys) | unique))',
         ],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        shell=False,
         input=yml,
-        universal_newlines=True,
-        text=True,
-        check=True,
     ).stdout
 
 
@@ -129,7 +111,7 @@ def format_gitlab_ci(yml: str) -> str:
 
     Raises:
         MalformedError: Formatting produced malformed result.
-        CommandError: Yq query failed.
+        CommandError: Yq query failed or timed out.
 
     Returns:
         str: Formatted yaml string.
@@ -143,5 +125,7 @@ def format_gitlab_ci(yml: str) -> str:
         stderr: str = e.stderr
         stderr = json.dumps(stderr.strip())
         raise CommandError(stderr) from e
+    except TimeoutExpired as e:
+        raise CommandError(str(e)) from e
 
     return result
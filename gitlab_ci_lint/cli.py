@@ -1,24 +1,40 @@
-# ruff: noqa: C901, PLR0911, PLR0912, PLR0915
+# ruff: noqa: C901, PLR0911, PLR0912, PLR0913, PLR0915
 # C901 `main` is too complex
 # PLR0915 Too many statements
 # PLR0911 Too many return statements
 # PLR0912 Too many branches
+# PLR0913 Too many arguments to function definition
 
 import argparse
 import logging
 import os
 import sys
+from concurrent.futures import wait
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 import git
 
+from gitlab_ci_common.exceptions import DeadlineExceededError
+from gitlab_ci_common.includes import WorktreeSource
+from gitlab_ci_common.runtime import (
+    TIMEOUT_POLICIES,
+    get_deadline,
+    get_executor,
+    positive_float,
+    report_unfinished,
+    set_deadline,
+)
 from gitlab_ci_lint.utils import (
+    StagedSource,
+    changed_files,
     check_pass,
+    file_project,
     get_access_token,
     get_gitlab_project,
+    include_index,
     lint_gitlab_api,
-    remote_to_project,
+    tracked_pipelines,
 )
 
 logging.basicConfig(format="%(levelname)s: %(filename)s:%(lineno)d %(message)s")
@@ -37,83 +53,270 @@ def cli(argv: list[str] = sys.argv[1:]) -> int:
     parser = argparse.ArgumentParser(
         prog="gitlab-ci-lint", description="Lint gitlab-ci files."
     )
-    parser.add_argument("files", nargs="+", type=Path, help="files to lint")
+    parser.add_argument("files", nargs="*", type=Path, help="files to lint")
+    parser.add_argument(
+        "--since",
+        type=str,
+        metavar="REF",
+        help="lint root pipelines whose local includes changed since REF",
+    )
+    parser.add_argument(
+        "--staged",
+        action="store_true",
+        default=False,
+        help="lint root pipelines whose local includes have staged changes",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=positive_float,
+        default=None,
+        metavar="SECONDS",
+        help="time budget shared by all files",
+    )
+    parser.add_argument(
+        "--on-timeout",
+        type=str,
+        default="fail",
+        choices=TIMEOUT_POLICIES,
+        help="whether files left unfinished by the time budget fail or warn",
+    )
     parser.add_argument(
         "-v", "--verbose", action="store_true", default=False, help="verbose output"
     )
 
     args = parser.parse_args(argv)
     files: List[Path] = args.files
+    since: Optional[str] = args.since
+    staged: bool = args.staged
+    timeout: Optional[float] = args.timeout
+    policy: str = args.on_timeout
     verbose: bool = args.verbose
 
+    if not files and since is None and not staged:
+        parser.error("the following arguments are required: files")
+
     if verbose or os.environ.get("DEBUG") not in [None, "false", "no", "0"]:
         logger.setLevel(logging.DEBUG)
+        logging.getLogger("gitlab_ci_common").setLevel(logging.DEBUG)
 
     logger.debug(f"Args: {args._get_kwargs()}")
 
+    set_deadline(timeout)
+    source = WorktreeSource()
+
     try:
         check_pass()
+    except DeadlineExceededError:
+        return report_unfinished(unfinished_names(files), policy)
     except Exception as e:
         logger.error(f"Pass check failed: {e!s}", exc_info=verbose)
         return 1
 
-    try:
-        repo = git.Repo(Path.cwd(), search_parent_directories=True)
-    except Exception as e:
-        logger.error(f"Failed to access git repo: {e!s}", exc_info=verbose)
-        return 1
+    if since is not None or staged:
+        try:
+            repo = git.Repo(Path.cwd(), search_parent_directories=True)
+        except Exception as e:
+            logger.error(f"Failed to access git repo: {e!s}", exc_info=verbose)
+            return 1
 
-    logger.debug(f"Repo: {repo.working_dir}")
+        logger.debug(f"Repo: {repo.working_dir}")
 
-    try:
-        origin = repo.remotes["origin"].url
-    except IndexError:
-        logger.error("Repository does not have an 'origin' remote", exc_info=verbose)
-        return 1
+        if staged:
+            try:
+                source = StagedSource(repo)
+            except DeadlineExceededError:
+                return report_unfinished(unfinished_names(files), policy)
+            except Exception as e:
+                logger.error(f"Failed to read git index: {e!s}", exc_info=verbose)
+                return 1
 
-    logger.debug(f"Origin url: {origin}")
+        try:
+            changed = changed_files(repo, since, staged)
+        except DeadlineExceededError:
+            return report_unfinished(unfinished_names(files), policy)
+        except Exception as e:
+            logger.error(f"Failed to get changed files: {e!s}", exc_info=verbose)
+            return 1
 
-    try:
-        (gitlab_url, project_name) = remote_to_project(origin)
-    except Exception as e:
-        logger.error(f"Failed to parse git url: {e!s}", exc_info=verbose)
-        return 1
+        logger.debug(f"Changed files: {[str(p) for p in changed]}")
 
-    logger.debug(f"Gitlab URL: {gitlab_url}")
-    logger.debug(f"Project name: {project_name}")
+        try:
+            candidates = files or tracked_pipelines(repo)
+        except DeadlineExceededError:
+            return report_unfinished(unfinished_names(files), policy)
+        except Exception as e:
+            logger.error(f"Failed to list pipeline files: {e!s}", exc_info=verbose)
+            return 1
 
-    try:
-        token = get_access_token(gitlab_url)
-    except Exception as e:
-        logger.error(f"Failed to get access token: {e!s}", exc_info=verbose)
-        return 1
+        index = include_index(repo, source)
+        try:
+            get_deadline().check()
+            files = index.affected(candidates, changed)
+        except DeadlineExceededError:
+            return report_unfinished(unfinished_names(candidates), policy)
+        index.save()
+
+        for file in candidates:
+            if file not in files:
+                logger.debug(f"Skipping unaffected file '{file}'")
+
+        if not files:
+            return 0
 
-    logger.debug(f"Access token: {token}")
+    projects: Dict[Tuple[str, str], List[Path]] = {}
+    for file in files:
+        try:
+            (gitlab_url, project_name) = file_project(file)
+        except Exception as e:
+            logger.error(
+                f"Failed to resolve gitlab project of '{file!s}': {e!s}",
+                exc_info=verbose,
+            )
+            return 1
 
+        logger.debug(f"Project of '{file}': {gitlab_url}/{project_name}")
+        projects.setdefault((gitlab_url, project_name), []).append(file)
+
+    tokens: Dict[str, str] = {}
+    for gitlab_url, _ in projects:
+        if gitlab_url in tokens:
+            continue
+        try:
+            tokens[gitlab_url] = get_access_token(gitlab_url)
+        except DeadlineExceededError:
+            return report_unfinished([str(f) for f in files], policy)
+        except Exception as e:
+            logger.error(
+                f"Failed to get access token for '{gitlab_url}': {e!s}",
+                exc_info=verbose,
+            )
+            return 1
+
+        logger.debug(f"Access token for '{gitlab_url}' acquired")
+
+    return lint_projects(projects, tokens, verbose, source, policy)
+
+
+def unfinished_names(files: List[Path]) -> List[str]:
+    """Get names reported as unfinished when the deadline passed.
+
+    Args:
+        files (List[Path]): Files left unfinished, empty when not yet known.
+
+    Returns:
+        List[str]: File names, the program name when no file is known yet.
+    """
+    return [str(f) for f in files] or ["gitlab-ci-lint"]
+
+
+def lint_projects(
+    projects: Dict[Tuple[str, str], List[Path]],
+    tokens: Dict[str, str],
+    verbose: bool,
+    source: WorktreeSource,
+    policy: str,
+) -> int:
+    """Lint files of several GitLab projects concurrently within the deadline.
+
+    Args:
+        projects (Dict[Tuple[str, str], List[Path]]): Files by GitLab http api url
+            and project path.
+        tokens (Dict[str, str]): Private access tokens by GitLab http api url.
+        verbose (bool): Log tracebacks.
+        source (WorktreeSource): Source files are read from.
+        policy (str): 'warn' or 'fail' for files left unfinished.
+
+    Returns:
+        int: Return code.
+    """
+    executor = get_executor()
+    linted: List[Path] = []
+    futures = {
+        executor.submit(
+            lint_project,
+            gitlab_url,
+            project_name,
+            tokens[gitlab_url],
+            project_files,
+            verbose,
+            source,
+            linted,
+        ): project_files
+        for (gitlab_url, project_name), project_files in projects.items()
+    }
+
+    wait(futures, timeout=get_deadline().remaining())
+
+    return_code = 0
+    unfinished: List[str] = []
+    for future, project_files in futures.items():
+        if not future.done():
+            future.cancel()
+            unfinished.extend(str(f) for f in project_files if f not in linted)
+            continue
+
+        (project_return_code, project_unfinished) = future.result()
+        return_code = max(return_code, project_return_code)
+        unfinished.extend(str(f) for f in project_unfinished)
+
+    return max(return_code, report_unfinished(unfinished, policy))
+
+
+def lint_project(
+    gitlab_url: str,
+    project_name: str,
+    token: str,
+    files: List[Path],
+    verbose: bool,
+    source: WorktreeSource,
+    linted: List[Path],
+) -> Tuple[int, List[Path]]:
+    """Lint gitlab-ci files against a GitLab project.
+
+    Args:
+        gitlab_url (str): GitLab http api url.
+        project_name (str): GitLab project path.
+        token (str): Private access token.
+        files (List[Path]): Files to lint.
+        verbose (bool): Log tracebacks.
+        source (WorktreeSource): Source files are read from.
+        linted (List[Path]): Files are appended once linting finished.
+
+    Returns:
+        Tuple[int, List[Path]]: Return code and files left unfinished when the
+            global deadline expired.
+    """
     try:
         project = get_gitlab_project(gitlab_url, project_name, token)
     except Exception as e:
-        logger.error(f"Failed to access gitlab project: {e!s}", exc_info=verbose)
-        return 1
+        logger.error(
+            f"Failed to access gitlab project '{project_name}': {e!s}",
+            exc_info=verbose,
+        )
+        return (1, [])
 
-    for file in files:
+    for i, file in enumerate(files):
         logger.debug(f"Linting file '{file}'")
         try:
-            with file.open("r") as src_file:
+            with source.open(file) as src_file:
                 yml = src_file.read()
         except OSError as e:
             logger.error(f"Failed to access '{file!s}': {e.strerror}", exc_info=verbose)
-            return 1
+            return (1, [])
         except Exception as e:
             logger.error(f"Failed to access '{file!s}': {e!s}", exc_info=verbose)
-            return 1
+            return (1, [])
 
         try:
             lint_gitlab_api(project, yml)
+        except DeadlineExceededError:
+            return (0, files[i:])
         except Exception as e:
             logger.error(f"Linting of file '{file!s}' failed: {e!s}", exc_info=verbose)
-            return 1
+            linted.append(file)
+            return (1, [])
         else:
             logger.debug(f"Linting of file '{file}' successful", exc_info=verbose)
+            linted.append(file)
 
-    return 0
+    return (0, [])
@@ -16,3 +16,9 @@ class InvalidGitUrlError(Error):
     def __init__(self, remote: str) -> None:
         message = f"'{remote}' is not a valid git url"
         super().__init__(message)
+
+
+class MissingRemoteError(Error):
+    def __init__(self, repo: str) -> None:
+        message = f"Repository '{repo}' does not have an 'origin' remote"
+        super().__init__(message)
@@ -1,21 +1,50 @@
+import contextlib
+import errno
+import functools
+import io
 import json
 import re
-import subprocess
+import socket
+import threading
 import unicodedata
-from subprocess import CalledProcessError
-from typing import Tuple
+import weakref
+from pathlib import Path
+from subprocess import CalledProcessError, TimeoutExpired
+from typing import Dict, List, Mapping, Optional, Set, TextIO, Tuple, Union
 
+import git
 import gitlab
 import gitlab.exceptions
 import giturlparse  # type: ignore
+import requests
+import requests.adapters
+import urllib3
+import urllib3.connection
 from gitlab.v4.objects import Project as GitlabProject
 
+from gitlab_ci_common.exceptions import BinaryNotFoundError, DeadlineExceededError
+from gitlab_ci_common.includes import (
+    IncludeIndex,
+    Signature,
+    WorktreeSource,
+    find_repo_root,
+)
+from gitlab_ci_common.runtime import get_deadline, probe_version, run_command
 from gitlab_ci_lint.exceptions import (
     CommandError,
     InvalidGitUrlError,
+    MissingRemoteError,
     PassNotFoundError,
 )
 
+PIPELINE_PATHSPEC = "*.gitlab-ci.yml"
+
+TimeoutType = Union[None, float, Tuple[float, float], Tuple[float, None]]
+CertType = Union[None, bytes, str, Tuple[Union[bytes, str], Union[bytes, str]]]
+
+_clients = threading.local()
+_sockets = threading.local()
+
 
 def slugify(value: str, allow_unicode: bool = False) -> str:
     """Slugify string.
@@ -47,19 +76,15 @@ def check_pass() -> None:
         PassNotFoundError: Pass not in PATH.
     """
     try:
-        subprocess.run(
-            ["pass", "--version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-            universal_newlines=True,
-            text=True,
-            check=True,
-        )
+        probe_version("pass")
+    except BinaryNotFoundError as e:
+        raise PassNotFoundError(str(e)) from e
     except CalledProcessError as e:
         stderr: str = e.stderr
         stderr = json.dumps(stderr.strip())
         raise PassNotFoundError(stderr) from e
+    except TimeoutExpired as e:
+        raise PassNotFoundError(str(e)) from e
 
 
 def get_access_token(url: str) -> str:
@@ -69,7 +94,7 @@ def get_access_token(url: str) -> str:
         url (str): Gitlab host url.
 
     Raises:
-        CommandError: When pass returns an error.
+        CommandError: When pass returns an error or times out.
 
     Returns:
         str: Personal access token.
@@ -77,20 +102,14 @@ def get_access_token(url: str) -> str:
     url_slug = slugify(url)
 
     try:
-        show_output = subprocess.run(
-            ["pass", "show", "--", f"gitlab-ci-lint/{url_slug}"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-            universal_newlines=True,
-            text=True,
-            check=True,
-        )
+        show_output = run_command(["pass", "show", "--", f"gitlab-ci-lint/{url_slug}"])
         token = show_output.stdout.strip()
     except CalledProcessError as e:
         stderr: str = e.stderr
         stderr = json.dumps(stderr.strip())
         raise CommandError(stderr) from e
+    except TimeoutExpired as e:
+        raise CommandError(str(e)) from e
     else:
         return token
 
@@ -102,7 +121,7 @@ def remote_to_project(remote: str) -> Tuple[str, str]:
         remote (str): Git remote.
 
     Raises:
-        RemoteParseError: When remote parsing fails.
+        InvalidGitUrlError: When remote parsing fails.
 
     Returns:
         Tuple[str, str]: Host url and project path.
@@ -117,6 +136,183 @@ def remote_to_project(remote: str) -> Tuple[str, str]:
         raise InvalidGitUrlError(remote)
 
 
+@functools.lru_cache(maxsize=None)
+def repo_project(root: Path) -> Tuple[str, str]:
+    """Get GitLab host url and project path of a repository 'origin' remote.
+
+    Results are memoized per repository root.
+
+    Args:
+        root (Path): Repository root.
+
+    Raises:
+        InvalidGitRepositoryError: When root is not a git repository.
+        MissingRemoteError: When repository has no 'origin' remote.
+        InvalidGitUrlError: When remote parsing fails.
+
+    Returns:
+        Tuple[str, str]: Host url and project path.
+    """
+    repo = git.Repo(root)
+    try:
+        origin = repo.remotes["origin"].url
+    except IndexError as e:
+        raise MissingRemoteError(str(root)) from e
+    return remote_to_project(origin)
+
+
+def file_project(file: Path) -> Tuple[str, str]:
+    """Get GitLab host url and project path of the repository owning a file.
+
+    Files in submodules resolve to the submodule repository.
+
+    Args:
+        file (Path): File path.
+
+    Raises:
+        InvalidGitRepositoryError: When file is not in a git repository.
+        MissingRemoteError: When repository has no 'origin' remote.
+        InvalidGitUrlError: When remote parsing fails.
+
+    Returns:
+        Tuple[str, str]: Host url and project path.
+    """
+    return repo_project(find_repo_root(file.parent))
+
+
+def _thread_sockets() -> "weakref.WeakSet[socket.socket]":
+    if not hasattr(_sockets, "connected"):
+        _sockets.connected = weakref.WeakSet()
+    sockets: "weakref.WeakSet[socket.socket]" = _sockets.connected
+    return sockets
+
+
+class _HTTPConnection(urllib3.connection.HTTPConnection):
+    def connect(self) -> None:
+        super().connect()
+        _thread_sockets().add(self.sock)
+
+
+class _HTTPSConnection(urllib3.connection.HTTPSConnection):
+    def connect(self) -> None:
+        super().connect()
+        _thread_sockets().add(self.sock)
+
+
+class _HTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+def _abort_sockets(sockets: "weakref.WeakSet[socket.socket]") -> None:
+    for sock in list(sockets):
+        with contextlib.suppress(OSError):
+            sock.shutdown(socket.SHUT_RDWR)
+
+
+class DeadlineAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter failing requests still running when the deadline expires.
+
+    Request timeouts only limit single socket operations, so a server sending
+    slowly can keep a request going far beyond the global deadline. Sockets
+    connected by the requesting thread are shut down once the deadline expires.
+    """
+
+    def init_poolmanager(
+        self,
+        connections: int,
+        maxsize: int,
+        block: bool = False,
+        **pool_kwargs: object,
+    ) -> None:
+        """Create pool manager remembering connected sockets per thread.
+
+        Args:
+            connections (int): Number of connection pools to cache.
+            maxsize (int): Maximum number of connections per pool.
+            block (bool, optional): Block when no connection is free. Defaults to
+                False.
+            **pool_kwargs (object): Extra pool arguments.
+        """
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool,
+            "https": _HTTPSConnectionPool,
+        }
+
+    def send(  # noqa: PLR0913
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: TimeoutType = None,
+        verify: Union[bool, str] = True,
+        cert: CertType = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        """Send request, aborting it when the global deadline expires.
+
+        Args:
+            request (requests.PreparedRequest): Request.
+            stream (bool, optional): Do not read the body. Defaults to False.
+            timeout (TimeoutType, optional): Connect and read timeouts. Defaults to
+                None.
+            verify (Union[bool, str], optional): TLS verification or CA bundle.
+                Defaults to True.
+            cert (CertType, optional): Client certificate. Defaults to None.
+            proxies (Optional[Mapping[str, str]], optional): Proxies. Defaults to
+                None.
+
+        Returns:
+            requests.Response: Response.
+        """
+        remaining = get_deadline().remaining()
+        if remaining is None:
+            return super().send(request, stream, timeout, verify, cert, proxies)
+
+        timer = threading.Timer(remaining, _abort_sockets, [_thread_sockets()])
+        timer.daemon = True
+        timer.start()
+        try:
+            response = super().send(request, stream, timeout, verify, cert, proxies)
+            if not stream:
+                # Read body before the timer is cancelled, the session would
+                # otherwise read it afterwards.
+                response.content  # noqa: B018
+            return response
+        finally:
+            timer.cancel()
+
+
+def get_gitlab_server(gitlab_url: str, token: str) -> gitlab.Gitlab:
+    """Get GitLab api client, shared per thread, host and token.
+
+    Sharing the client reuses its connection pool for all projects of a host
+    linted by the same thread. Clients are not shared between threads, as
+    their http session is not thread-safe. Requests are aborted when the
+    global deadline expires, see DeadlineAdapter.
+
+    Args:
+        gitlab_url (str): GitLab http api url.
+        token (str): Private access token.
+
+    Returns:
+        gitlab.Gitlab: GitLab api client.
+    """
+    if not hasattr(_clients, "by_server"):
+        _clients.by_server = {}
+    clients: Dict[Tuple[str, str], gitlab.Gitlab] = _clients.by_server
+    if (gitlab_url, token) not in clients:
+        client = gitlab.Gitlab(gitlab_url, private_token=token)
+        adapter = DeadlineAdapter()
+        client.session.mount("http://", adapter)
+        client.session.mount("https://", adapter)
+        clients[(gitlab_url, token)] = client
+    return clients[(gitlab_url, token)]
+
+
 def get_gitlab_project(gitlab_url: str, project: str, token: str) -> GitlabProject:
     """Get GitLab project api object.
 
@@ -133,13 +329,13 @@ def get_gitlab_project(gitlab_url: str, project: str, token: str) -> GitlabProje
     Returns:
         GitlabProject: Gitlab project.
     """
-    gitlab_server = gitlab.Gitlab(gitlab_url, private_token=token)
+    gitlab_server = get_gitlab_server(gitlab_url, token)
     gitlab_project = gitlab_server.projects.get(project, lazy=True)
     return gitlab_project
 
 
 def lint_gitlab_api(project: GitlabProject, yml: str) -> None:
-    """Lint yaml string using GitLab api.
+    """Lint yaml string using GitLab api within the global deadline.
 
     Args:
         project (GitlabProject): GitLab project.
@@ -147,5 +343,148 @@ def lint_gitlab_api(project: GitlabProject, yml: str) -> None:
 
     Raises:
         GitlabCiLintError: When linting fails.
+        DeadlineExceededError: When global deadline expires.
+    """
+    deadline = get_deadline()
+    deadline.check()
+
+    timeout = deadline.remaining()
+    options = {} if timeout is None else {"timeout": timeout}
+    try:
+        project.ci_lint.validate({"content": yml}, **options)
+    except requests.exceptions.RequestException as e:
+        if deadline.expired():
+            raise DeadlineExceededError() from e
+        raise
+
+
+def run_git(repo: git.Repo, *args: str) -> str:
+    """Run git command in a repository within the global deadline.
+
+    Args:
+        repo (git.Repo): Git repository.
+        *args (str): Git arguments.
+
+    Raises:
+        CalledProcessError: When git returns an error.
+        TimeoutExpired: When git times out.
+        DeadlineExceededError: When global deadline expires.
+
+    Returns:
+        str: Standard output.
+    """
+    return run_command(["git", "-C", str(repo.working_dir), *args]).stdout
+
+
+def changed_files(repo: git.Repo, since: Optional[str], staged: bool) -> Set[Path]:
+    """Get files changed in a git repository.
+
+    Args:
+        repo (git.Repo): Git repository.
+        since (Optional[str]): Compare against this ref instead of HEAD.
+        staged (bool): Only consider staged changes.
+
+    Raises:
+        CalledProcessError: When git diff fails.
+        TimeoutExpired: When git diff times out.
+        DeadlineExceededError: When global deadline expires.
+
+    Returns:
+        Set[Path]: Resolved paths of changed files.
+    """
+    args = ["diff", "--name-only", "--no-renames", "-z"]
+    if staged:
+        args.append("--cached")
+    if since is not None:
+        args.append(since)
+
+    output = run_git(repo, *args)
+    root = Path(repo.working_dir)
+    return {(root / name).resolve() for name in output.split("\0") if name}
+
+
+def tracked_pipelines(repo: git.Repo) -> List[Path]:
+    """Get gitlab-ci files tracked in a git repository.
+
+    Args:
+        repo (git.Repo): Git repository.
+
+    Raises:
+        CalledProcessError: When git ls-files fails.
+        TimeoutExpired: When git ls-files times out.
+        DeadlineExceededError: When global deadline expires.
+
+    Returns:
+        List[Path]: Gitlab-ci file paths.
+    """
+    output = run_git(repo, "ls-files", "-z", "--", PIPELINE_PATHSPEC)
+    root = Path(repo.working_dir)
+    return [root / name for name in output.split("\0") if name]
+
+
+class StagedSource(WorktreeSource):
+    """Read files as staged in the git index instead of the working tree."""
+
+    def __init__(self, repo: git.Repo) -> None:
+        self.repo = repo
+        self.blobs: Dict[Path, str] = {}
+
+        output = run_git(repo, "ls-files", "--stage", "-z")
+        root = Path(repo.working_dir)
+        for entry in output.split("\0"):
+            if not entry:
+                continue
+            (info, name) = entry.split("\t", 1)
+            (_, sha, _) = info.split(" ")
+            self.blobs[(root / name).resolve()] = sha
+
+    def signature(self, file: Path) -> Signature:
+        """Get signature identifying the staged state of a file.
+
+        Args:
+            file (Path): File path.
+
+        Returns:
+            Signature: Staged blob id, None if not staged.
+        """
+        sha = self.blobs.get(file.resolve())
+        return None if sha is None else [sha]
+
+    def open(self, file: Path) -> TextIO:
+        """Open staged file content for reading.
+
+        Args:
+            file (Path): File path.
+
+        Raises:
+            FileNotFoundError: File is not staged.
+            CalledProcessError: When git cat-file fails.
+            TimeoutExpired: When git cat-file times out.
+            DeadlineExceededError: When global deadline expires.
+
+        Returns:
+            TextIO: Staged content stream.
+        """
+        sha = self.blobs.get(file.resolve())
+        if sha is None:
+            raise FileNotFoundError(errno.ENOENT, "File is not staged", str(file))
+        return io.StringIO(run_git(self.repo, "cat-file", "blob", sha))
+
+
+def include_index(repo: git.Repo, source: WorktreeSource) -> IncludeIndex:
+    """Get include index of a git repository, persisted in its git directory.
+
+    Args:
+        repo (git.Repo): Git repository.
+        source (WorktreeSource): Source files are read from.
+
+    Returns:
+        IncludeIndex: Loaded include index.
     """
-    project.ci_lint.validate({"content": yml})
+    index = IncludeIndex(
+        Path(repo.working_dir),
+        Path(repo.git_dir) / "gitlab-ci-lint" / "includes.json",
+        source,
+    )
+    index.load()
+    return index
@@ -1,23 +1,37 @@
-# ruff: noqa: C901, PLR0911, PLR0912, PLR0915
+# ruff: noqa: C901, PLR0911, PLR0912, PLR0913, PLR0915
 # C901 `main` is too complex
 # PLR0911 Too many return statements
 # PLR0912 Too many branches
+# PLR0913 Too many arguments to function definition
 # PLR0915 Too many statements
 
 import argparse
 import logging
 import os
-import subprocess
 import sys
 import uuid
+from concurrent.futures import Future
 from pathlib import Path
+from subprocess import CompletedProcess
 from tempfile import TemporaryDirectory
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
-import yaml
 from yaml import YAMLError
 
-from gitlab_ci_shellcheck.utils import check_shellcheck
+from gitlab_ci_common.exceptions import DeadlineExceededError, DocumentTypeError
+from gitlab_ci_common.runtime import (
+    TIMEOUT_POLICIES,
+    positive_float,
+    report_unfinished,
+    set_deadline,
+)
+from gitlab_ci_common.watch import watch as watch_files
+from gitlab_ci_shellcheck.utils import (
+    check_shellcheck,
+    iter_jobs,
+    shellcheck_result,
+    submit_shellcheck,
+)
 
 logging.basicConfig(format="%(levelname)s: %(filename)s:%(lineno)d %(message)s")
 logger = logging.getLogger(__name__)
@@ -62,34 +76,105 @@ def cli(argv: list[str] = sys.argv[1:]) -> int:
     parser.add_argument(
         "-v", "--verbose", action="store_true", default=False, help="verbose output"
     )
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        default=False,
+        help="check files and their local includes again on every change",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=positive_float,
+        default=None,
+        metavar="SECONDS",
+        help="time budget shared by all files, per run in watch mode",
+    )
+    parser.add_argument(
+        "--on-timeout",
+        type=str,
+        default="fail",
+        choices=TIMEOUT_POLICIES,
+        help="whether files left unfinished by the time budget fail or warn",
+    )
 
     args = parser.parse_args(argv)
     files: List[Path] = args.files
-    color: bool = args.color
-    severity = args.severity
+    color: str = args.color
+    severity: str = args.severity
     verbose: bool = args.verbose
+    watch: bool = args.watch
+    timeout: Optional[float] = args.timeout
+    policy: str = args.on_timeout
+
+    deadline = set_deadline(timeout)
+
+    if watch:
+        logging.getLogger("gitlab_ci_common").setLevel(logging.INFO)
 
     if verbose or os.environ.get("DEBUG") not in [None, "false", "no", "0"]:
         logger.setLevel(logging.DEBUG)
+        logging.getLogger("gitlab_ci_common").setLevel(logging.DEBUG)
 
     logger.debug(f"Args: {args._get_kwargs()}")
 
     try:
         check_shellcheck()
+    except DeadlineExceededError:
+        return report_unfinished([str(f) for f in files], policy)
     except Exception as e:
         logger.error(f"Shellcheck check failed: {e!s}", exc_info=verbose)
         return 1
 
+    if watch:
+        cache: Dict[Path, Dict[Tuple[str, str], Tuple[int, str]]] = {}
+
+        def run(changed: List[Path]) -> int:
+            set_deadline(timeout)
+            return check_files_cached(changed, color, severity, verbose, policy, cache)
+
+        return watch_files(files, run)
+
     with TemporaryDirectory() as temp_dir_a:
         temp_dir = Path(temp_dir_a)
-        file_map = {}
+        pending: List[Tuple[Path, Dict[str, str], Future[CompletedProcess[str]]]] = []
+        unfinished: List[str] = []
 
         logger.debug(f"Temporary directory path: {temp_dir!s}", exc_info=verbose)
 
-        for file in files:
+        for i, file in enumerate(files):
+            file_map: Dict[str, str] = {}
+            job_files: Dict[str, List[str]] = {}
             try:
                 with file.open("r") as stream:
-                    data = yaml.safe_load(stream)
+                    for job, sections in iter_jobs(stream):
+                        deadline.check()
+
+                        for old_file in job_files.pop(job, []):
+                            logger.debug(f"Dropping redefined job script: {old_file}")
+                            del file_map[old_file]
+                            Path(old_file).unlink()
+
+                        for section in sections:
+                            id = uuid.uuid4()
+                            temp_file = temp_dir / str(id)
+
+                            logger.debug(f"Temporary file path: {temp_file!s}")
+                            logger.debug(
+                                f"Script at line {section.line}: {section.script}"
+                            )
+
+                            with temp_file.open("w") as tf:
+                                tf.write("\n".join(section.script))
+                                tf.flush()
+
+                            mapping = f"{file}@{section.job}.{section.key}"
+                            file_map[str(temp_file)] = mapping
+                            job_files.setdefault(job, []).append(str(temp_file))
+                            logger.debug(f"File map entry: {temp_file!s} => {mapping}")
+            except DeadlineExceededError:
+                unfinished.extend(str(f) for f in files[i:])
+                break
             except YAMLError as e:
                 error_message = str(e).replace("\n", "")
                 logger.error(
@@ -97,6 +182,9 @@ def cli(argv: list[str] = sys.argv[1:]) -> int:
                     exc_info=verbose,
                 )
                 return 1
+            except DocumentTypeError as e:
+                logger.error(f"Invalid yaml file '{file!s}': {e!s}", exc_info=verbose)
+                return 1
             except OSError as e:
                 logger.error(
                     f"Failed to access '{file!s}': {e.strerror}", exc_info=verbose
@@ -106,78 +194,133 @@ def cli(argv: list[str] = sys.argv[1:]) -> int:
                 logger.error(f"Failed to access '{file!s}': {e!s}", exc_info=verbose)
                 return 1
 
-            logger.debug(f"Yaml data: {data!s}")
+            if file_map:
+                future = submit_shellcheck(file_map, color, severity)
+                pending.append((file, file_map, future))
 
-            if not isinstance(data, dict):
+        return_code = 0
+        for file, file_map, future in pending:
+            try:
+                file_return_code, message = shellcheck_result(future.result(), file_map)
+            except DeadlineExceededError:
+                unfinished.append(str(file))
+                continue
+            except Exception as e:
                 logger.error(
-                    f"Object type of '{file!s}' is '{type(data).__name__!s}', expected 'Dict'",
-                    exc_info=verbose,
+                    f"Shellcheck of '{file!s}' failed: {e!s}", exc_info=verbose
                 )
-                return 1
+                return_code = 1
+                continue
 
-            for job_key, job in data.items():
-                if isinstance(job, dict):
-                    for script_key, script in job.items():
-                        if script_key in ["before_script", "script", "after_script"]:
-                            id = uuid.uuid4()
-                            temp_file = temp_dir / str(id)
+            if file_return_code != 0:
+                print(message, end="", file=sys.stderr)
+                return_code = 1
 
-                            logger.debug(f"Temporary file path: {temp_file!s}")
-                            logger.debug(f"Script: {script}")
-
-                            try:
-                                with temp_file.open("w") as tf:
-                                    tf.write("\n".join(script))
-                                    tf.flush()
-                            except OSError as e:
-                                logger.error(
-                                    f"Failed to access '{file!s}': {e.strerror}",
-                                    exc_info=verbose,
-                                )
-                                return 1
-                            except Exception as e:
-                                logger.error(
-                                    f"Failed to access '{file!s}': {e}",
-                                    exc_info=verbose,
-                                )
-                                return 1
-
-                            mapping = f"{file}@{job_key}.{script_key}"
-                            file_map[str(temp_file)] = mapping
-                            logger.debug(f"File map entry: {temp_file!s} => {mapping}")
+        return max(return_code, report_unfinished(unfinished, policy))
 
-        shellcheck_files = set(file_map.keys())
 
-        if not shellcheck_files:
-            return 0
+def check_files_cached(
+    files: List[Path],
+    color: str,
+    severity: str,
+    verbose: bool,
+    policy: str,
+    cache: Dict[Path, Dict[Tuple[str, str], Tuple[int, str]]],
+) -> int:
+    """Shellcheck scripts of gitlab-ci files, reusing results of unchanged scripts.
 
-        cmd = [
-            "shellcheck",
-            f"-C{color}",
-            f"--severity={severity}",
-            "--",
-            *shellcheck_files,
-        ]
+    Each changed script is checked by a separate concurrent shellcheck run,
+    so that its result can be cached by job and content. Cache entries of
+    scripts that no longer exist are dropped.
 
-        logger.debug(f"Running command: {cmd}")
+    Args:
+        files (List[Path]): Files to check.
+        color (str): Shellcheck color mode.
+        severity (str): Shellcheck minimum severity.
+        verbose (bool): Log tracebacks.
+        policy (str): Timeout policy, see report_unfinished.
+        cache (Dict[Path, Dict[Tuple[str, str], Tuple[int, str]]]): Shellcheck
+            results by file, job mapping and script, reused and filled in.
 
-        process = subprocess.run(  # noqa: PLW1510
-            cmd, shell=False, capture_output=True, universal_newlines=True, text=True
-        )
+    Returns:
+        int: Return code.
+    """
+    return_code = 0
+    unfinished: List[str] = []
+    checked = []
+
+    with TemporaryDirectory() as temp_dir_a:
+        temp_dir = Path(temp_dir_a)
+
+        for file in files:
+            try:
+                with file.open("r") as stream:
+                    jobs = dict(iter_jobs(stream))
+                sections = [s for job_sections in jobs.values() for s in job_sections]
+            except YAMLError as e:
+                error_message = str(e).replace("\n", "")
+                logger.error(
+                    f"Failed load yaml file '{file!s}': {error_message}",
+                    exc_info=verbose,
+                )
+                return_code = 1
+                continue
+            except DocumentTypeError as e:
+                logger.error(f"Invalid yaml file '{file!s}': {e!s}", exc_info=verbose)
+                return_code = 1
+                continue
+            except OSError as e:
+                logger.error(
+                    f"Failed to access '{file!s}': {e.strerror}", exc_info=verbose
+                )
+                return_code = 1
+                continue
+
+            previous = cache.get(file.resolve(), {})
+            results = {}
+            pending = {}
+            for section in sections:
+                script = "\n".join(section.script)
+                mapping = f"{file}@{section.job}.{section.key}"
+                key = (mapping, script)
+
+                if key in previous:
+                    results[key] = previous[key]
+                    continue
+
+                logger.debug(f"Checking changed script: {mapping}")
+                temp_file = temp_dir / str(uuid.uuid4())
+                try:
+                    temp_file.write_text(script)
+                except OSError as e:
+                    logger.error(
+                        f"Failed to access '{file!s}': {e.strerror}", exc_info=verbose
+                    )
+                    return_code = 1
+                    continue
+                file_map = {str(temp_file): mapping}
+                pending[key] = (
+                    file_map,
+                    submit_shellcheck(file_map, color, severity),
+                )
 
-        message = str()
-        if process.stderr:
-            message += process.stderr
+            checked.append((file, results, pending))
 
-        if process.stdout:
-            message += process.stdout
+        for file, results, pending in checked:
+            for key, (file_map, future) in pending.items():
+                try:
+                    results[key] = shellcheck_result(future.result(), file_map)
+                except DeadlineExceededError:
+                    unfinished.append(key[0])
+                except Exception as e:
+                    logger.error(f"Shellcheck of '{key[0]}' failed: {e!s}")
+                    return_code = 1
 
-        if message:
-            for k, v in file_map.items():
-                message = message.replace(k, v)
+            cache[file.resolve()] = results
 
-        if process.returncode != 0:
-            print(message, end="", file=sys.stderr)
-            return 1
+            for script_return_code, message in results.values():
+                if script_return_code != 0:
+                    print(message, end="", file=sys.stderr)
+                    return_code = 1
 
-        return 0
+    return max(return_code, report_unfinished(unfinished, policy))
@@ -1,9 +1,24 @@
 import json
-import subprocess
-from subprocess import CalledProcessError
+from concurrent.futures import Future
+from subprocess import CalledProcessError, CompletedProcess, TimeoutExpired
+from typing import Any, Dict, Iterator, List, NamedTuple, TextIO, Tuple
 
+from yaml.nodes import MappingNode
+
+from gitlab_ci_common.exceptions import BinaryNotFoundError
+from gitlab_ci_common.runtime import get_executor, probe_version
+from gitlab_ci_common.stream import iter_entries
 from gitlab_ci_shellcheck.exceptions import ShellcheckNotFoundError
 
+SCRIPT_KEYS = ("before_script", "script", "after_script")
+
+
+class ScriptSection(NamedTuple):
+    job: str
+    key: str
+    line: int
+    script: Any
+
 
 def check_shellcheck() -> None:
     """Check if shellcheck in PATH.
@@ -12,16 +27,106 @@ def check_shellcheck() -> None:
         ShellcheckNotFoundError: Shellcheck not in PATH.
     """
     try:
-        subprocess.run(
-            ["shellcheck", "--version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-            universal_newlines=True,
-            text=True,
-            check=True,
-        )
+        probe_version("shellcheck")
+    except BinaryNotFoundError as e:
+        raise ShellcheckNotFoundError(str(e)) from e
     except CalledProcessError as e:
         stderr: str = e.stderr
         stderr = json.dumps(stderr.strip())
         raise ShellcheckNotFoundError(stderr) from e
+    except TimeoutExpired as e:
+        raise ShellcheckNotFoundError(str(e)) from e
+
+
+def iter_jobs(stream: TextIO) -> Iterator[Tuple[str, List[ScriptSection]]]:
+    """Iterate over jobs of a gitlab-ci yaml stream with their script sections.
+
+    Only a single job is held in memory at a time and only its script
+    sections are constructed into python objects. Every top level entry is
+    yielded, so that consumers can let a repeated key replace the earlier
+    definition like yaml.safe_load does.
+
+    Args:
+        stream (TextIO): Yaml stream.
+
+    Raises:
+        DocumentTypeError: Document root is not a mapping.
+        YAMLError: Yaml stream is malformed.
+
+    Yields:
+        Iterator[Tuple[str, List[ScriptSection]]]: Job name and script sections
+            in document order.
+    """
+    for loader, key_node, job_node in iter_entries(stream):
+        job = str(loader.construct_object(key_node, deep=True))
+        if not isinstance(job_node, MappingNode):
+            yield (job, [])
+            continue
+
+        loader.flatten_mapping(job_node)
+        script_nodes = {}
+        for script_key_node, script_node in job_node.value:
+            if script_key_node.value in SCRIPT_KEYS:
+                script_nodes[script_key_node.value] = script_node
+
+        yield (
+            job,
+            [
+                ScriptSection(
+                    job=job,
+                    key=key,
+                    line=node.start_mark.line + 1,
+                    script=loader.construct_object(node, deep=True),
+                )
+                for key, node in script_nodes.items()
+            ],
+        )
+
+
+def submit_shellcheck(
+    file_map: Dict[str, str], color: str, severity: str
+) -> "Future[CompletedProcess[str]]":
+    """Schedule shellcheck run on script files.
+
+    Args:
+        file_map (Dict[str, str]): Script file paths and their display names.
+        color (str): Shellcheck color mode.
+        severity (str): Shellcheck minimum severity.
+
+    Returns:
+        Future[CompletedProcess[str]]: Shellcheck process.
+    """
+    cmd = [
+        "shellcheck",
+        f"-C{color}",
+        f"--severity={severity}",
+        "--",
+        *file_map.keys(),
+    ]
+    return get_executor().run(cmd, check=False)
+
+
+def shellcheck_result(
+    process: "CompletedProcess[str]", file_map: Dict[str, str]
+) -> Tuple[int, str]:
+    """Get shellcheck return code and output with display names.
+
+    Args:
+        process (CompletedProcess[str]): Shellcheck process.
+        file_map (Dict[str, str]): Script file paths and their display names.
+
+    Returns:
+        Tuple[int, str]: Return code and output with display names.
+    """
+    message = str()
+    if process.stderr:
+        message += process.stderr
+
+    if process.stdout:
+        message += process.stdout
+
+    if message:
+        for k, v in file_map.items():
+            message = message.replace(k, v)
+
+    return (process.returncode, message)
@@ -0,0 +1,60 @@
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict
+
+import pytest
+
+Git = Callable[..., str]
+Writer = Callable[[Path, Dict[str, str]], None]
+RepoFactory = Callable[[Path, str, Dict[str, str]], Path]
+
+
+@pytest.fixture()
+def git(monkeypatch: pytest.MonkeyPatch) -> Git:
+    """Run git in a repository with a fixed identity and no user config."""
+    monkeypatch.setenv("GIT_CONFIG_GLOBAL", "/dev/null")
+    monkeypatch.setenv("GIT_CONFIG_NOSYSTEM", "1")
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "test")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "test@example.com")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "test")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "test@example.com")
+
+    def run(repo: Path, *args: str) -> str:
+        process = subprocess.run(
+            ["git", "-C", str(repo), *args],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return process.stdout
+
+    return run
+
+
+@pytest.fixture()
+def write() -> Writer:
+    """Write files relative to a directory, creating parent directories."""
+
+    def run(root: Path, files: Dict[str, str]) -> None:
+        for name, content in files.items():
+            path = root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(content)
+
+    return run
+
+
+@pytest.fixture()
+def make_repo(git: Git, write: Writer) -> RepoFactory:
+    """Create a git repository with an origin remote and committed files."""
+
+    def run(path: Path, remote: str, files: Dict[str, str]) -> Path:
+        path.mkdir(parents=True, exist_ok=True)
+        git(path, "init", "-q")
+        git(path, "remote", "add", "origin", remote)
+        write(path, files)
+        git(path, "add", "-A")
+        git(path, "commit", "-q", "-m", "init")
+        return path
+
+    return run
@@ -0,0 +1,172 @@
+import logging
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator
+
+import git as gitpython
+import pytest
+
+import gitlab_ci_lint.cli
+from gitlab_ci_common.exceptions import DeadlineExceededError
+from gitlab_ci_common.runtime import set_deadline
+from gitlab_ci_lint.utils import (
+    changed_files,
+    get_gitlab_project,
+    lint_gitlab_api,
+    tracked_pipelines,
+)
+
+RepoFactory = Callable[[Path, str, Dict[str, str]], Path]
+
+DRIP_BYTES = 20
+DRIP_INTERVAL = 0.5
+TIMEOUT = 1.0
+MAX_ELAPSED = 2.5
+
+
+class DripHandler(BaseHTTPRequestHandler):
+    """Answer every request with a body sent one byte at a time."""
+
+    def do_POST(self) -> None:  # noqa: N802, D102
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(DRIP_BYTES))
+        self.end_headers()
+        try:
+            for _ in range(DRIP_BYTES):
+                self.wfile.write(b" ")
+                self.wfile.flush()
+                time.sleep(DRIP_INTERVAL)
+        except OSError:
+            pass
+
+    def log_message(self, *args: object) -> None:  # noqa: D102
+        pass
+
+
+@pytest.fixture()
+def repo(make_repo: RepoFactory, tmp_path: Path) -> Iterator[Path]:
+    """Repository with a pipeline, resetting the deadline set by tests."""
+    yield make_repo(
+        tmp_path / "repo",
+        "git@gitlab.example.com:group/project.git",
+        {".gitlab-ci.yml": "job: {script: [true]}\n"},
+    )
+    set_deadline(None)
+
+
+@pytest.fixture()
+def drip_url() -> Iterator[str]:
+    """Serve DripHandler on a free local port."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), DripHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_aborted_at_deadline(drip_url: str) -> None:
+    """Slow responses fail once the deadline expires."""
+    project = get_gitlab_project(drip_url, "group/project", "token")
+    set_deadline(TIMEOUT)
+    started = time.monotonic()
+    try:
+        with pytest.raises(DeadlineExceededError):
+            lint_gitlab_api(project, "job: {script: [true]}\n")
+    finally:
+        set_deadline(None)
+    assert time.monotonic() - started < MAX_ELAPSED
+
+
+def test_exit_not_blocked_by_abandoned_projects(drip_url: str, tmp_path: Path) -> None:
+    """Process exits shortly after the deadline with projects still linting."""
+    files = []
+    for i in range(3):
+        file = tmp_path / f"{i}.gitlab-ci.yml"
+        file.write_text("job: {script: [true]}\n")
+        files.append(file)
+
+    script = textwrap.dedent(
+        f"""
+        import sys
+        from pathlib import Path
+
+        from gitlab_ci_common.includes import WorktreeSource
+        from gitlab_ci_common.runtime import set_deadline
+        from gitlab_ci_lint.cli import lint_projects
+
+        set_deadline({TIMEOUT!r})
+        projects = {{
+            ({drip_url!r}, f"group/project-{{i}}"): [Path(file)]
+            for i, file in enumerate({[str(f) for f in files]!r})
+        }}
+        tokens = {{{drip_url!r}: "token"}}
+        sys.exit(lint_projects(projects, tokens, False, WorktreeSource(), "fail"))
+        """
+    )
+    started = time.monotonic()
+    process = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        timeout=30,
+        check=False,
+    )
+    elapsed = time.monotonic() - started
+
+    assert process.returncode == 1, process.stderr
+    for file in files:
+        assert f"Time budget exceeded before '{file!s}'" in process.stderr
+    assert elapsed < MAX_ELAPSED
+
+
+def test_git_commands_fail_at_deadline(repo: Path) -> None:
+    """Git commands are not started once the deadline expired."""
+    git_repo = gitpython.Repo(repo)
+    set_deadline(0.001)
+    time.sleep(0.01)
+    with pytest.raises(DeadlineExceededError):
+        changed_files(git_repo, None, True)
+    with pytest.raises(DeadlineExceededError):
+        tracked_pipelines(git_repo)
+
+
+@pytest.mark.parametrize(("policy", "return_code"), [("fail", 1), ("warn", 0)])
+def test_deadline_before_files_known(
+    repo: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
+    policy: str,
+    return_code: int,
+) -> None:
+    """Expiring before candidate files are known is reported under the policy."""
+    monkeypatch.setattr(gitlab_ci_lint.cli, "check_pass", lambda: None)
+    monkeypatch.chdir(repo)
+    args = ["--staged", "--timeout", "0.000001", "--on-timeout", policy]
+
+    with caplog.at_level(logging.WARNING):
+        assert gitlab_ci_lint.cli.cli(args) == return_code
+    assert "Time budget exceeded before 'gitlab-ci-lint'" in caplog.text
+
+
+def test_pass_check_at_deadline_fails_without_files(
+    repo: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    """Expiring during the pass check fails even before files are selected."""
+
+    def check_pass() -> None:
+        raise DeadlineExceededError()
+
+    monkeypatch.setattr(gitlab_ci_lint.cli, "check_pass", check_pass)
+    monkeypatch.chdir(repo)
+
+    assert gitlab_ci_lint.cli.cli(["--staged"]) == 1
+    assert "Time budget exceeded before 'gitlab-ci-lint'" in caplog.text
@@ -0,0 +1,144 @@
+import json
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import git as gitpython
+import pytest
+
+import gitlab_ci_lint.cli
+from gitlab_ci_common.includes import IncludeIndex, WorktreeSource, include_closure
+from gitlab_ci_lint.utils import (
+    StagedSource,
+    changed_files,
+    include_index,
+    tracked_pipelines,
+)
+
+Git = Callable[..., str]
+Writer = Callable[[Path, Dict[str, str]], None]
+RepoFactory = Callable[[Path, str, Dict[str, str]], Path]
+
+REMOTE = "git@gitlab.example.com:group/project.git"
+
+FILES = {
+    "a.gitlab-ci.yml": "include: [{local: /ci/a.yml}]\na: {script: [a]}\n",
+    "b.gitlab-ci.yml": "include: ci/b.yml\nb: {script: [b]}\n",
+    "ci/a.yml": "include: /ci/common.yml\na-job: {script: [a]}\n",
+    "ci/b.yml": "b-job: {script: [b]}\n",
+    "ci/common.yml": "common: {script: [common]}\n",
+}
+
+
+@pytest.fixture()
+def repo(make_repo: RepoFactory, tmp_path: Path) -> Path:
+    """Repository with two root pipelines and nested includes."""
+    return make_repo(tmp_path / "repo", REMOTE, FILES)
+
+
+def affected(repo: Path, staged: bool = True) -> List[str]:
+    """Get names of root pipelines affected by changes against HEAD."""
+    git_repo = gitpython.Repo(repo)
+    source = StagedSource(git_repo) if staged else WorktreeSource()
+    index = include_index(git_repo, source)
+    roots = index.affected(
+        tracked_pipelines(git_repo), changed_files(git_repo, None, staged)
+    )
+    index.save()
+    return [p.relative_to(repo).as_posix() for p in roots]
+
+
+def test_staged_nested_include_marks_only_its_root(
+    repo: Path, git: Git, write: Writer
+) -> None:
+    """A staged change to a nested include only affects its root pipeline."""
+    write(repo, {"ci/common.yml": "common: {script: [changed]}\n"})
+    git(repo, "add", "ci/common.yml")
+    write(repo, {"ci/b.yml": "b-job: {script: [unstaged]}\n"})
+
+    assert affected(repo) == ["a.gitlab-ci.yml"]
+
+
+def test_unaffected_roots_skip_api(
+    repo: Path, git: Git, write: Writer, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Only affected root pipelines are sent to the lint api."""
+    linted: List[str] = []
+    monkeypatch.setattr(gitlab_ci_lint.cli, "check_pass", lambda: None)
+    monkeypatch.setattr(gitlab_ci_lint.cli, "get_access_token", lambda url: "token")
+    monkeypatch.setattr(
+        gitlab_ci_lint.cli, "lint_gitlab_api", lambda project, yml: linted.append(yml)
+    )
+    monkeypatch.chdir(repo)
+
+    assert gitlab_ci_lint.cli.cli(["--staged"]) == 0
+    assert linted == []
+
+    write(repo, {"ci/b.yml": "b-job: {script: [staged]}\n"})
+    git(repo, "add", "ci/b.yml")
+    write(repo, {"b.gitlab-ci.yml": "include: ci/b.yml\nb: {script: [unstaged]}\n"})
+
+    assert gitlab_ci_lint.cli.cli(["--staged"]) == 0
+    assert linted == [FILES["b.gitlab-ci.yml"]]
+
+
+def test_deleted_include_marks_parent(repo: Path, git: Git) -> None:
+    """Deleting an included file affects the pipelines including it."""
+    assert affected(repo) == []
+    git(repo, "rm", "-q", "ci/common.yml")
+
+    assert affected(repo) == ["a.gitlab-ci.yml"]
+
+
+def test_deleted_file_keeps_includes(repo: Path) -> None:
+    """Deleted files keep the includes they had when last indexed."""
+    index = IncludeIndex(repo)
+    assert index.includes(repo / "ci/a.yml") == [repo / "ci/common.yml"]
+
+    (repo / "ci/a.yml").unlink()
+    assert index.includes(repo / "ci/a.yml") == [repo / "ci/common.yml"]
+
+
+def test_stale_index_entry_parsed_again(repo: Path, git: Git, write: Writer) -> None:
+    """Persisted entries are parsed again once their signature changed."""
+    assert affected(repo, staged=False) == []
+    path = repo / ".git/gitlab-ci-lint/includes.json"
+    data = json.loads(path.read_text())
+    assert data["files"]["ci/b.yml"]["patterns"] == []
+
+    data["files"]["b.gitlab-ci.yml"] = {"signature": [0, 0, 0], "patterns": []}
+    path.write_text(json.dumps(data))
+    write(repo, {"ci/b.yml": "include: /ci/common.yml\nb-job: {script: [b]}\n"})
+    write(repo, {"ci/common.yml": "common: {script: [changed]}\n"})
+
+    assert affected(repo, staged=False) == ["a.gitlab-ci.yml", "b.gitlab-ci.yml"]
+    data = json.loads(path.read_text())
+    assert data["files"]["b.gitlab-ci.yml"]["patterns"] == ["ci/b.yml"]
+    assert data["files"]["ci/b.yml"]["patterns"] == ["/ci/common.yml"]
+
+
+def test_staged_source_reads_index(repo: Path, git: Git, write: Writer) -> None:
+    """Staged content is read instead of the working tree."""
+    write(repo, {"ci/b.yml": "staged: {script: [b]}\n"})
+    git(repo, "add", "ci/b.yml")
+    write(repo, {"ci/b.yml": "unstaged: {script: [b]}\n", "new.yml": "new: {}\n"})
+
+    source = StagedSource(gitpython.Repo(repo))
+    with source.open(repo / "ci/b.yml") as stream:
+        assert stream.read() == "staged: {script: [b]}\n"
+    assert source.signature(repo / "new.yml") is None
+    with pytest.raises(FileNotFoundError):
+        source.open(repo / "new.yml")
+
+
+def test_includes_resolved_in_own_repository(
+    repo: Path, make_repo: RepoFactory
+) -> None:
+    """Includes of a nested repository resolve against its own root."""
+    make_repo(
+        repo / "sub",
+        "git@gitlab.example.com:group/sub.git",
+        {"sub.gitlab-ci.yml": "include: /ci/common.yml\n", "ci/common.yml": ""},
+    )
+
+    closure = include_closure([repo / "sub/sub.gitlab-ci.yml"], IncludeIndex(repo))
+    assert closure == [repo / "sub/sub.gitlab-ci.yml", repo / "sub/ci/common.yml"]
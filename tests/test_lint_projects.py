@@ -0,0 +1,50 @@
+from pathlib import Path
+from typing import Callable, Dict
+
+from gitlab_ci_lint.utils import file_project
+
+Git = Callable[..., str]
+RepoFactory = Callable[[Path, str, Dict[str, str]], Path]
+
+
+def test_submodule_files_resolve_to_own_project(
+    tmp_path: Path, git: Git, make_repo: RepoFactory
+) -> None:
+    """Files of a submodule belong to the submodule project."""
+    sub_origin = make_repo(
+        tmp_path / "sub-origin",
+        "git@gitlab.example.com:group/sub.git",
+        {"sub.gitlab-ci.yml": "sub: {script: [sub]}\n"},
+    )
+    repo = make_repo(
+        tmp_path / "repo",
+        "git@gitlab.example.com:group/project.git",
+        {".gitlab-ci.yml": "main: {script: [main]}\n"},
+    )
+    git(
+        repo,
+        "-c",
+        "protocol.file.allow=always",
+        "submodule",
+        "add",
+        "-q",
+        str(sub_origin),
+        "sub",
+    )
+    git(
+        repo / "sub",
+        "remote",
+        "set-url",
+        "origin",
+        "git@gitlab.example.com:group/sub.git",
+    )
+    assert (repo / "sub/.git").is_file()
+
+    assert file_project(repo / ".gitlab-ci.yml") == (
+        "https://gitlab.example.com",
+        "group/project",
+    )
+    assert file_project(repo / "sub/sub.gitlab-ci.yml") == (
+        "https://gitlab.example.com",
+        "group/sub",
+    )
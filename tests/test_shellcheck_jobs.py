@@ -0,0 +1,163 @@
+import io
+from typing import Any, Dict
+
+import pytest
+import yaml
+
+from gitlab_ci_common.exceptions import DocumentTypeError
+from gitlab_ci_shellcheck.utils import SCRIPT_KEYS, iter_jobs
+
+MAPPINGS = {
+    "plain": """
+        build:
+          before_script: [setup]
+          script: [make]
+          after_script: [cleanup]
+        test: {script: make test}
+    """,
+    "anchor and alias": """
+        .base: &base
+          script: [make]
+        build: *base
+        test:
+          script: *base
+    """,
+    "merge key": """
+        .base: &base
+          before_script: [setup]
+          script: [make]
+        build:
+          <<: *base
+          script: [make build]
+    """,
+    "merge key list": """
+        .setup: &setup {before_script: [setup]}
+        .make: &make {script: [make], before_script: [other]}
+        build:
+          <<: [*setup, *make]
+    """,
+    "top level merge key": """
+        .jobs: &jobs
+          build: {script: [make]}
+        <<: *jobs
+        test: {script: [make test]}
+    """,
+    "explicit job before top level merge key": """
+        build: {script: [explicit]}
+        .jobs: &jobs
+          build: {script: [merged]}
+          test: {script: [merged]}
+        <<: *jobs
+    """,
+    "job after top level merge key": """
+        .jobs: &jobs
+          build: {script: [merged]}
+        <<: *jobs
+        build: {script: [explicit]}
+    """,
+    "top level merge keys": """
+        .first: &first {build: {script: [first]}, test: {script: [first]}}
+        .second: &second {build: {script: [second]}}
+        <<: *first
+        <<: *second
+        <<: [*second, *first]
+    """,
+    "value key": """
+        =: {script: [value]}
+    """,
+    "alias reused after repeated job": """
+        .base: &base {script: [make]}
+        build: *base
+        build: {script: [make build]}
+        test: *base
+    """,
+    "repeated job": """
+        build: {script: [first]}
+        test: {script: [make test]}
+        build: {after_script: [second]}
+    """,
+    "repeated script key": """
+        build:
+          script: [first]
+          script: [second]
+    """,
+    "non mapping jobs": """
+        stages: [build, test]
+        variables: {A: b}
+        workflow: null
+        default: 1
+    """,
+    "non string job names": """
+        1: {script: [one]}
+        1.5: {script: [half]}
+        false: {script: [no]}
+        null: {script: [none]}
+    """,
+    "empty mapping": "{}",
+}
+
+NON_MAPPINGS = {
+    "empty": "",
+    "comment only": "# nothing\n",
+    "null": "null\n",
+    "explicit document": "---\n...\n",
+    "list": "- build\n- test\n",
+    "scalar": "build\n",
+    "tagged mapping": "!!set {build, test}\n",
+}
+
+MALFORMED = {
+    "multiple documents": "a: {script: [a]}\n---\nb: {script: [b]}\n",
+    "multiple empty documents": "---\n---\n",
+    "undefined alias": "build: *base\n",
+    "unclosed flow mapping": "build: {script: [a]\n",
+    "unhashable job name": "[build]: {script: [a]}\n",
+    "merge of a list": "<<: [[build]]\n",
+    "multiple documents after non mapping": "- a\n---\n- b\n",
+}
+
+
+def expected_jobs(yml: str) -> Dict[str, Dict[str, Any]]:
+    """Get script sections of every job as loaded by yaml.safe_load."""
+    data = yaml.safe_load(yml)
+    assert isinstance(data, dict)
+    return {
+        str(job): (
+            {key: value[key] for key in SCRIPT_KEYS if key in value}
+            if isinstance(value, dict)
+            else {}
+        )
+        for job, value in data.items()
+    }
+
+
+def streamed_jobs(yml: str) -> Dict[str, Dict[str, Any]]:
+    """Get script sections of every job from iter_jobs, last definition wins."""
+    return {
+        job: {section.key: section.script for section in sections}
+        for job, sections in iter_jobs(io.StringIO(yml))
+    }
+
+
+@pytest.mark.parametrize("yml", MAPPINGS.values(), ids=MAPPINGS.keys())
+def test_iter_jobs_matches_safe_load(yml: str) -> None:
+    """Jobs and script sections match yaml.safe_load."""
+    yml = yml.replace("\n        ", "\n")
+    assert streamed_jobs(yml) == expected_jobs(yml)
+
+
+@pytest.mark.parametrize("yml", NON_MAPPINGS.values(), ids=NON_MAPPINGS.keys())
+def test_iter_jobs_rejects_non_mapping_root(yml: str) -> None:
+    """Documents yaml.safe_load does not load as a mapping are rejected."""
+    assert not isinstance(yaml.safe_load(yml), dict)
+    with pytest.raises(DocumentTypeError):
+        streamed_jobs(yml)
+
+
+@pytest.mark.parametrize("yml", MALFORMED.values(), ids=MALFORMED.keys())
+def test_iter_jobs_rejects_malformed(yml: str) -> None:
+    """Streams yaml.safe_load fails on are rejected."""
+    with pytest.raises(yaml.YAMLError):
+        yaml.safe_load(yml)
+    with pytest.raises(yaml.YAMLError):
+        streamed_jobs(yml)